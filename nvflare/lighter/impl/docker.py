@@ -19,6 +19,7 @@ import shutil
 import yaml
 
 from nvflare.lighter.spec import Builder
+from nvflare.lighter.utils import YamlSafeDumper
 
 
 class DockerBuilder(Builder):
@@ -86,7 +87,7 @@ class DockerBuilder(Builder):
         self.services.pop("__flclient__", None)
         self.compose["services"] = self.services
         with open(self.compose_file_path, "wt") as f:
-            yaml.dump(self.compose, f)
+            yaml.dump(self.compose, f, Dumper=YamlSafeDumper)
         env_file_path = os.path.join(self.get_wip_dir(ctx), ".env")
         with open(env_file_path, "wt") as f:
             f.write("WORKSPACE=/workspace\n")
@@ -17,6 +17,7 @@ import os
 import yaml
 
 from nvflare.lighter.spec import Builder
+from nvflare.lighter.utils import YamlSafeDumper
 
 
 class HelmChartBuilder(Builder):
@@ -41,12 +42,12 @@ class HelmChartBuilder(Builder):
             0
         ] = f"/workspace/{overseer.name}/startup/start.sh"
         with open(os.path.join(self.helm_chart_templates_directory, "deployment_overseer.yaml"), "wt") as f:
-            yaml.dump(self.deployment_overseer, f)
+            yaml.dump(self.deployment_overseer, f, Dumper=YamlSafeDumper)
 
         self.service_overseer["spec"]["ports"][0]["port"] = port
         self.service_overseer["spec"]["ports"][0]["targetPort"] = port
         with open(os.path.join(self.helm_chart_templates_directory, "service_overseer.yaml"), "wt") as f:
-            yaml.dump(self.service_overseer, f)
+            yaml.dump(self.service_overseer, f, Dumper=YamlSafeDumper)
 
     def _build_server(self, server, ctx):
         fed_learn_port = server.props.get("fed_learn_port", 30002)
@@ -75,7 +76,7 @@ class HelmChartBuilder(Builder):
                 cmd_args[i] = f"org={server.org}"
         self.deployment_server["spec"]["template"]["spec"]["containers"][0]["args"] = cmd_args
         with open(os.path.join(self.helm_chart_templates_directory, f"deployment_server{idx}.yaml"), "wt") as f:
-            yaml.dump(self.deployment_server, f)
+            yaml.dump(self.deployment_server, f, Dumper=YamlSafeDumper)
 
         self.service_server["metadata"]["name"] = f"{server.name}"
         self.service_server["metadata"]["labels"]["system"] = f"{server.name}"
@@ -89,15 +90,15 @@ class HelmChartBuilder(Builder):
         self.service_server["spec"]["ports"][1]["targetPort"] = admin_port
 
         with open(os.path.join(self.helm_chart_templates_directory, f"service_server{idx}.yaml"), "wt") as f:
-            yaml.dump(self.service_server, f)
+            yaml.dump(self.service_server, f, Dumper=YamlSafeDumper)
 
     def build(self, project, ctx):
         self.template = ctx.get("template")
         with open(os.path.join(self.helm_chart_directory, "Chart.yaml"), "wt") as f:
-            yaml.dump(yaml.safe_load(self.template.get("helm_chart_chart")), f)
+            yaml.dump(yaml.safe_load(self.template.get("helm_chart_chart")), f, Dumper=YamlSafeDumper)
 
         with open(os.path.join(self.helm_chart_directory, "values.yaml"), "wt") as f:
-            yaml.dump(yaml.safe_load(self.template.get("helm_chart_values")), f)
+            yaml.dump(yaml.safe_load(self.template.get("helm_chart_values")), f, Dumper=YamlSafeDumper)
 
         self.service_overseer = yaml.safe_load(self.template.get("helm_chart_service_overseer"))
         self.service_server = yaml.safe_load(self.template.get("helm_chart_service_server"))
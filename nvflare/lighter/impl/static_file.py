@@ -90,7 +90,7 @@ class StaticFileBuilder(Builder):
                 privilege_dict[role] = [admin.subject]
         utils._write(
             os.path.join(dest_dir, "privilege.yml"),
-            yaml.dump(privilege_dict, Dumper=yaml.Dumper),
+            yaml.dump(privilege_dict, Dumper=utils.YamlSafeDumper),
             "t",
             exe=False,
         )
@@ -33,6 +33,7 @@ from nvflare.fuel.utils.gpu_utils import get_host_gpu_ids
 from nvflare.lighter.provision import gen_default_project_config, prepare_project
 from nvflare.lighter.spec import Provisioner
 from nvflare.lighter.utils import (
+    YamlSafeDumper,
     load_yaml,
     update_project_server_name_config,
     update_server_default_host,
@@ -325,7 +326,7 @@ def get_service_config(project_config):
 
 def save_project_config(project_config, project_file):
     with open(project_file, "w") as file:
-        yaml.dump(project_config, file)
+        yaml.dump(project_config, file, Dumper=YamlSafeDumper)
 
 
 def update_server_name(project_config):
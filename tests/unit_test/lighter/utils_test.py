@@ -13,19 +13,35 @@
 # limitations under the License.
 
 import datetime
+import json
+import math
 import os
 import shutil
+import string
 import tempfile
 
 import pytest
+import yaml
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
 from cryptography.x509.oid import NameOID
 
+from nvflare.lighter import utils
 from nvflare.lighter.impl.cert import serialize_cert
-from nvflare.lighter.utils import sign_folders, verify_folder_signature
+from nvflare.lighter.tool_consts import NVFLARE_SIG_FILE
+from nvflare.lighter.utils import (
+    generate_password,
+    load_yaml,
+    sh_replace,
+    sign_all,
+    sign_folders,
+    update_project_server_name,
+    update_storage_locations,
+    verify_content,
+    verify_folder_signature,
+)
 
 folders = ["folder1", "folder2"]
 files = ["file1", "file2"]
@@ -144,3 +160,247 @@ class TestSignFolder:
         os.unlink("client.crt")
         os.unlink("root.crt")
         shutil.rmtree(folder)
+
+    def test_sign_folder_in_process_pool(self, monkeypatch):
+        monkeypatch.setattr(utils, "_MIN_TASKS_FOR_PROCESS_POOL", 1)
+        monkeypatch.setattr(utils, "_POOL_CHUNK_SIZE", 2)
+        monkeypatch.setattr(utils.os, "cpu_count", lambda: 2)
+        folder, server_pri_key, server_cert = prepare_folders()
+        assert verify_folder_signature(folder, "root.crt") is True
+        tamper_one_file(folder)
+        assert verify_folder_signature(folder, "root.crt") is False
+        os.unlink("client.crt")
+        os.unlink("root.crt")
+        shutil.rmtree(folder)
+
+    def test_sign_folder_in_process(self, monkeypatch):
+        def no_pool(*args, **kwargs):
+            raise AssertionError("small batches must not start a process pool")
+
+        monkeypatch.setattr(utils, "_map_tasks", no_pool)
+        folder, server_pri_key, server_cert = prepare_folders()
+        assert verify_folder_signature(folder, "root.crt") is True
+        os.unlink("client.crt")
+        os.unlink("root.crt")
+        shutil.rmtree(folder)
+
+    def test_verify_folder_signed_with_ed25519(self):
+        root_pri_key = rsa.generate_private_key(public_exponent=65537, key_size=2048, backend=default_backend())
+        root_cert = generate_cert("root", "nvidia", "root", root_pri_key, root_pri_key.public_key(), ca=True)
+        ed_pri_key = ed25519.Ed25519PrivateKey.generate()
+        ed_cert = generate_cert("client", "nvidia", "root", root_pri_key, ed_pri_key.public_key())
+        folder = create_folder()
+        with open("client.crt", "wb") as f:
+            f.write(serialize_cert(ed_cert))
+        with open("root.crt", "wb") as f:
+            f.write(serialize_cert(root_cert))
+        sign_folders(folder, ed_pri_key, "client.crt")
+        assert verify_folder_signature(folder, "root.crt") is True
+        tamper_one_file(folder)
+        assert verify_folder_signature(folder, "root.crt") is False
+        os.unlink("client.crt")
+        os.unlink("root.crt")
+        shutil.rmtree(folder)
+
+    def test_verify_manifest_with_leading_whitespace(self):
+        folder, server_pri_key, server_cert = prepare_folders()
+        for root, _, _ in os.walk(folder):
+            sig_file = os.path.join(root, NVFLARE_SIG_FILE)
+            with open(sig_file, "rt") as f:
+                manifest = f.read()
+            with open(sig_file, "wt") as f:
+                f.write("\n" + manifest)
+        assert verify_folder_signature(folder, "root.crt") is True
+        tamper_one_file(folder)
+        assert verify_folder_signature(folder, "root.crt") is False
+        os.unlink("client.crt")
+        os.unlink("root.crt")
+        shutil.rmtree(folder)
+
+    def test_verify_folder_with_cache(self, monkeypatch):
+        verified = []
+        verify_content = utils.verify_content
+
+        def counting_verify_content(**kwargs):
+            verified.append(kwargs)
+            verify_content(**kwargs)
+
+        monkeypatch.setattr(utils, "verify_content", counting_verify_content)
+        folder, server_pri_key, server_cert = prepare_folders()
+        assert verify_folder_signature(folder, "root.crt") is True
+        assert len(verified) == len(folders) * len(files) + len(folders)
+
+        # unchanged files and folder names are not verified again
+        verified.clear()
+        assert verify_folder_signature(folder, "root.crt") is True
+        assert len(verified) == 0
+
+        # same size and mtime but different content must still fail
+        path = os.path.join(folder, folders[0], files[0])
+        st = os.stat(path)
+        with open(path, "r+b") as f:
+            data = f.read()
+            f.seek(0)
+            f.write(bytes([data[0] ^ 0xFF]) + data[1:])
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        assert verify_folder_signature(folder, "root.crt") is False
+        os.unlink("client.crt")
+        os.unlink("root.crt")
+        shutil.rmtree(folder)
+
+
+@pytest.mark.parametrize("content", [b"", b"signed content", os.urandom(3 * 1024 * 1024 + 7)])
+@pytest.mark.parametrize(
+    "generate_key",
+    [
+        lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048, backend=default_backend()),
+        ed25519.Ed25519PrivateKey.generate,
+    ],
+    ids=["rsa", "ed25519"],
+)
+def test_sign_all_matches_raw_content_signature(content, generate_key):
+    pri_key = generate_key()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with open(os.path.join(tmp_dir, "file1"), "wb") as f:
+            f.write(content)
+        signatures = sign_all(tmp_dir, pri_key)
+    # prehashed signatures must still verify against the content itself, as SecurityContentManager does
+    verify_content(content=content, signature=signatures["file1"], public_key=pri_key.public_key())
+
+
+PROJECT_YAML = """api_version: 3
+name: example_project
+participants:
+  # change server1 to the FQDN of the server
+  - name: server1
+    type: server
+    org: nvidia
+    fed_learn_port: 8002
+  - name: site-1
+    type: client
+    org: nvidia
+"""
+
+
+@pytest.mark.parametrize(
+    "project_yaml, keeps_comments",
+    [
+        (PROJECT_YAML, True),
+        # "type" before "name" is not handled by the text edit and goes through yaml
+        (PROJECT_YAML.replace("  - name: server1\n    type: server\n", "  - type: server\n    name: server1\n"), False),
+    ],
+)
+def test_update_project_server_name(tmp_path, project_yaml, keeps_comments):
+    project_file = str(tmp_path / "project.yml")
+    with open(project_file, "wt") as f:
+        f.write(project_yaml)
+    update_project_server_name(project_file, "server1", "example.com")
+    with open(project_file, "rt") as f:
+        result = f.read()
+    assert ("# change server1" in result) == keeps_comments
+    participants = yaml.safe_load(result)["participants"]
+    assert participants[0]["name"] == "example.com"
+    assert participants[0]["fed_learn_port"] == 8002
+    assert participants[1]["name"] == "site-1"
+
+
+@pytest.mark.parametrize("server_name", ["-", "1.5", "null", "yes", "on", "0x1F", "2024-01-01"])
+def test_update_project_server_name_yaml_scalars(tmp_path, server_name):
+    project_file = str(tmp_path / "project.yml")
+    with open(project_file, "wt") as f:
+        f.write(PROJECT_YAML)
+    update_project_server_name(project_file, "server1", server_name)
+    with open(project_file, "rt") as f:
+        participants = yaml.safe_load(f)["participants"]
+    assert participants[0]["name"] == server_name
+    assert participants[0]["type"] == "server"
+
+
+def test_update_project_server_name_nested_type(tmp_path):
+    project_file = str(tmp_path / "project.yml")
+    with open(project_file, "wt") as f:
+        f.write(
+            "participants:\n"
+            "  - name: server1\n"
+            "    type: client\n"
+            "    props:\n"
+            "      type: server\n"
+            "  - name: server1\n"
+            "    type: server\n"
+        )
+    update_project_server_name(project_file, "server1", "example.com")
+    with open(project_file, "rt") as f:
+        participants = yaml.safe_load(f)["participants"]
+    assert participants[0]["name"] == "server1"
+    assert participants[1]["name"] == "example.com"
+
+
+def test_load_yaml_cache(tmp_path):
+    project_file = str(tmp_path / "project.yml")
+    with open(project_file, "wt") as f:
+        f.write(PROJECT_YAML)
+    config = load_yaml(project_file)
+    config["participants"].clear()
+    # callers get their own copy of the cached config
+    assert load_yaml(project_file)["participants"][0]["name"] == "server1"
+
+    update_project_server_name(project_file, "server1", "example.com")
+    assert load_yaml(project_file)["participants"][0]["name"] == "example.com"
+
+
+@pytest.mark.parametrize("passlen", [8, 16, 100])
+def test_generate_password(passlen):
+    password = generate_password(passlen)
+    assert len(password) == passlen
+    assert password.isalnum()
+
+
+@pytest.mark.parametrize("alphabet", [string.ascii_letters + string.digits, "abcde", "x"])
+def test_fast_password_draws_from_alphabet(alphabet):
+    # sizes that are not a power of two make the masked draws hit the rejection path
+    password = utils._fast_password(1000, alphabet)
+    assert len(password) == 1000
+    assert set(password) <= set(alphabet)
+
+
+@pytest.mark.parametrize("alphabet", ["", "a" * 257])
+def test_fast_password_invalid_alphabet(alphabet):
+    with pytest.raises(ValueError):
+        utils._fast_password(16, alphabet)
+
+
+def test_sh_replace():
+    src = "{~~type~~} {~~port~~} {~~type~~} {~~unknown~~} {~~port"
+    assert sh_replace(src, {"type": "server", "port": 8002}) == "server 8002 server {~~unknown~~} {~~port"
+    assert sh_replace(src, {}) == src
+
+
+def test_update_storage_locations(tmp_path):
+    resources = {
+        "snapshot_persistor": {"args": {"storage": {"args": {"root_dir": "/tmp/snapshot-storage"}}}},
+        "components": [{"id": "job_manager", "args": {"uri_root": "/tmp/jobs-storage"}}],
+        "limits": {"big": 123456789012345678901234567890, "ratio": float("nan"), "max": float("inf")},
+    }
+    with open(tmp_path / "resources.json.default", "wt") as f:
+        json.dump(resources, f)
+    update_storage_locations(local_dir=str(tmp_path), workspace="/workspace")
+    with open(tmp_path / "resources.json", "rt") as f:
+        result = json.load(f)
+    assert result["snapshot_persistor"]["args"]["storage"]["args"]["root_dir"] == "/workspace/snapshot-storage"
+    assert result["components"][0]["args"]["uri_root"] == "/workspace/jobs-storage"
+    # values orjson would change or reject are kept as they are
+    assert result["limits"]["big"] == 123456789012345678901234567890
+    assert math.isnan(result["limits"]["ratio"])
+    assert result["limits"]["max"] == float("inf")
+
+
+@pytest.mark.parametrize("obj", [{1: "a", "b": [2**70]}, {"big": -(2**80)}])
+def test_json_dumps_matches_json_module(obj):
+    assert json.loads(utils._json_dumps(obj)) == json.loads(json.dumps(obj))
+
+
+@pytest.mark.parametrize("orjson_ok", [True, False])
+def test_json_loads_manifest(monkeypatch, orjson_ok):
+    monkeypatch.setattr(utils, "orjson_ok", orjson_ok and utils.orjson_ok)
+    manifest = {"file1": "c2lnbmF0dXJl", "folder1": "c2lnbmF0dXJlMg=="}
+    assert utils._json_loads(utils._json_dumps(manifest)) == manifest